@@ -1,82 +1,359 @@
-import openai
-from typing import Dict, List
-import yfinance as yf
+import asyncio
+import copy
+import functools
+import getpass
+import hashlib
+import importlib.util
+import math
+import shelve
+import threading
+import time
+import warnings
+import zlib
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+import numpy as np
 from datetime import datetime, timedelta
-import pandas as pd
+from pathlib import Path
+import orjson
 import os
 from dotenv import load_dotenv
 import requests
-from bs4 import BeautifulSoup
-import json
+from requests.adapters import HTTPAdapter
+import lxml.html
+from lxml import etree
 
 # Carrega as variáveis de ambiente do arquivo .env
 load_dotenv()
 
+# Prompt base para o GPT, partilhado por todas as instâncias
+_SYSTEM_PROMPT = """
+        É um consultor financeiro especializado. O cliente poderá fazer perguntas mais gerais sobre a sua situação financeira e pedir aconselhamento geral. Também poderá pedir ajuda para questões 
+        mais especóificas como qual seria a poupança em juros no caso de uma amortização de um crédito à habitação ou crédito pessoal. Tanto nos casos mais específicos como mais gerias antes de uma resposta final 
+        deverão ser feitas questões sobre os parâmetros utilizados para os cálculos como se utiliza taxa variável ou fixa, se existe algum spread, se utilzia o modelo frânces, etc.. As respostas devem ser completas e contemplar
+        a poupança no caso de a amortização ter efeito na prestação mensal ou no prazo de pagamento. Também poderâm ser feitas comparações entre investir o dinheiro em ações, obrigações, ou etfs e a amortização.
+        Os dados deverão ir sendo guardados para que o modelo possa ir aprendendo com as respostas dadas e melhorar a qualidade das respostas.
+        No caso de perguntas da vida financeira geral da pessoa as questões ao utilizador sobre parâmetros como valores que tem como reserva devem ser feitas de forma indirecta e não de forma directa. Pode ser aconselhado o valor ideial 
+        para ter em reserva por exemplo ou para ter na conta corrente ou num eventuial fundo de oportunidade. Estes valores devem ser calculados tendo em conta dados do utilziador. 
+        Deve ser utilziado portugês de Portugal.
+
+        """
+_SYSTEM_MESSAGE = {"role": "system", "content": _SYSTEM_PROMPT}
+
+# Diretório local onde o bot guarda dados entre execuções
+_DATA_DIR = Path.home() / ".finance_bot"
+_CACHE_PATH = _DATA_DIR / "cache"
+_HISTORY_DIR = _DATA_DIR / "history"
+# Utilizador usado quando não é indicado nenhum e o sistema não tem nome de login
+_DEFAULT_USER_ID = "default"
+
+# Cache em memória partilhada por todas as instâncias: chave -> (valor, expira_em)
+_cache: Dict[str, Tuple[object, float]] = {}
+_cache_lock = threading.Lock()
+
+def _disk_get(key: str) -> Optional[Tuple[object, float]]:
+    try:
+        with shelve.open(str(_CACHE_PATH)) as db:
+            return db.get(key)
+    except Exception:
+        # A cache em disco é opcional; sem ela continuamos só com a memória
+        return None
+
+def _disk_set(key: str, entry: Tuple[object, float]) -> None:
+    try:
+        _DATA_DIR.mkdir(parents=True, exist_ok=True)
+        with shelve.open(str(_CACHE_PATH)) as db:
+            db[key] = entry
+    except Exception:
+        pass
+
+# Sentinela devolvida por _cache_get quando não há valor válido em cache
+_MISS = object()
+
+def _cache_get(key: str) -> object:
+    """Devolve o valor em cache ainda válido para `key`, ou `_MISS`"""
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None:
+            entry = _disk_get(key)
+            if entry is not None:
+                _cache[key] = entry
+    if entry is not None and entry[1] > time.time():
+        # Cópia para que quem chama não altere o valor partilhado em cache
+        return copy.copy(entry[0])
+    return _MISS
+
+def _cache_set(key: str, value: object, ttl_seconds: int) -> None:
+    entry = (copy.copy(value), time.time() + ttl_seconds)
+    with _cache_lock:
+        _cache[key] = entry
+        _disk_set(key, entry)
+
+def _env_ttl(env: str, default: int) -> int:
+    """TTL em segundos definido na variável de ambiente `env`, ou `default`
+
+    É lido ao importar o módulo, por isso um valor inválido só gera um aviso em vez
+    de impedir o arranque.
+    """
+    value = os.getenv(env)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        warnings.warn(f"{env}={value!r} não é um número inteiro de segundos; a usar {default}")
+        return default
+
+def cached(ttl_seconds: int, env: Optional[str] = None):
+    """Memoriza o resultado de um método durante `ttl_seconds` segundos.
+
+    A chave é o nome da função e os argumentos (sem o `self`), por isso a cache é
+    partilhada entre instâncias e persistida em disco. Se `env` estiver definida no
+    ambiente, o seu valor substitui o TTL por omissão. Exceções não são guardadas.
+    """
+    if env:
+        ttl_seconds = _env_ttl(env, ttl_seconds)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args):
+            key = f"{func.__name__}:{args!r}"
+            value = _cache_get(key)
+            if value is _MISS:
+                value = func(self, *args)
+                _cache_set(key, value, ttl_seconds)
+            return value
+        return wrapper
+    return decorator
+
+@functools.cache
+def _yf():
+    """Importa o yfinance (e o pandas) só quando são pedidos dados de mercado"""
+    import yfinance
+    return yfinance
+
+def _login_user_id() -> str:
+    """Nome de login do utilizador atual, ou `_DEFAULT_USER_ID` se não existir"""
+    try:
+        return getpass.getuser()
+    except (KeyError, OSError):
+        # Acontece, por exemplo, em contentores que correm com um UID sem entrada no passwd
+        return _DEFAULT_USER_ID
+
+def _french_installment(principal: float, monthly_rate: float, months: int) -> float:
+    """Prestação mensal constante do método francês"""
+    if monthly_rate == 0:
+        return principal / months
+    return principal * monthly_rate / (1 - (1 + monthly_rate) ** -months)
+
+def _months_to_repay(principal: float, monthly_rate: float, installment: float) -> float:
+    """Número de meses (fracionário) necessários para liquidar `principal` com a prestação dada"""
+    if principal <= 0:
+        return 0.0
+    if monthly_rate == 0:
+        return principal / installment
+    return -math.log(1 - monthly_rate * principal / installment) / math.log(1 + monthly_rate)
+
+def _project(amount: float, rates: np.ndarray, horizons: np.ndarray) -> np.ndarray:
+    """Ganho acumulado de `amount` para cada taxa anual (linhas) e horizonte em anos (colunas)"""
+    return amount * (np.power(1 + rates[:, None], horizons) - 1)
+
 class FinanceBot:
-    def __init__(self):
+    # Atributos de instância fixos: sem __dict__ por instância e acesso mais rápido
+    __slots__ = (
+        "api_key",
+        "conversation_history",
+        "conversation_summary",
+        "sp500_historical_return",
+        "user_id",
+        "_safety_identifier",
+        "_client",
+        "_session",
+        "_summary_task",
+        "_history_path",
+    )
+
+    # Expressões XPath compiladas uma única vez, ao carregar a classe
+    _TABLE_ROWS = etree.XPath("//tr[td]")
+    _ROW_LABEL = etree.XPath("normalize-space(td[1])")
+    _ROW_VALUE = etree.XPath("normalize-space(td[2])")
+
+    # Fontes de dados de mercado e prazos Euribor procurados
+    _EURIBOR_URL = "https://www.euribor-rates.eu/en/current-euribor-rates/"
+    _EURIBOR_TERMS = ("1 week", "1 month", "3 months", "6 months", "12 months")
+    # Valores fallback caso a API falhe
+    _EURIBOR_FALLBACK = {
+        "1 week": 3.858,
+        "1 month": 3.923,
+        "3 months": 3.927,
+        "6 months": 3.892,
+        "12 months": 3.718
+    }
+    _SP500_CHART_URL = "https://query1.finance.yahoo.com/v8/finance/chart/%5EGSPC"
+    _SP500_CHART_PARAMS = {"range": "10y", "interval": "1mo"}
+    # TTL das cotações do lote, cacheadas símbolo a símbolo
+    _STOCK_QUOTE_TTL = _env_ttl("CACHE_TTL_STOCK", 300)
+
+    # Modelo usado nas respostas (pode ser alterado com OPENAI_MODEL)
+    MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    # Chave estável enviada em todos os pedidos para aproveitar a cache de prompts
+    PROMPT_CACHE_KEY = "finance-bot-v1"
+
+    # Mensagens mantidas no histórico. Quando este chega ao dobro, as mais antigas são
+    # resumidas de uma só vez (um resumo a cada MAX_TURNS mensagens, não a cada turno)
+    MAX_TURNS = 8
+    SUMMARY_MODEL = "gpt-4o-mini"
+    # Tempo máximo de espera (segundos) pelos pedidos HTTP de dados de mercado
+    HTTP_TIMEOUT = 5
+
+    def __init__(self, user_id: Optional[str] = None):
         # Obtém a chave API do ambiente
-        self.api_key = os.getenv('OPENAI_API_KEY')
-        if not self.api_key:
+        api_key = os.getenv('OPENAI_API_KEY')
+        if not api_key:
             raise ValueError("OPENAI_API_KEY não encontrada nas variáveis de ambiente")
+        self.api_key: str = api_key
         
-        openai.api_key = self.api_key
-        self.conversation_history = []
+        # Cliente reutilizado em todas as chamadas (evita recriar o pool de ligações).
+        # O HTTP/2 permite multiplexar pedidos na mesma ligação, mas exige o pacote h2.
+        http2 = importlib.util.find_spec("h2") is not None
+        self._client: AsyncOpenAI = AsyncOpenAI(
+            api_key=self.api_key,
+            http_client=DefaultAsyncHttpxClient(http2=http2, timeout=30)
+        )
+        self.conversation_history: List[Dict[str, str]] = []
+        self.conversation_summary: Optional[str] = None
+        self._summary_task: Optional[asyncio.Task] = None
+        
+        # Histórico guardado em disco por utilizador, para retomar a conversa entre sessões
+        self.user_id: str = user_id or _login_user_id()
+        # Identificador do utilizador final para a deteção de abusos da OpenAI (anonimizado)
+        self._safety_identifier: str = hashlib.sha256(self.user_id.encode()).hexdigest()
+        # O hash também dá um nome de ficheiro seguro e único para cada utilizador
+        self._history_path: Path = _HISTORY_DIR / f"{self._safety_identifier}.json.z"
+        self._load_history()
+        
+        # Sessão HTTP reutilizada para aproveitar ligações já abertas (keep-alive).
+        # O requests já pede respostas comprimidas (gzip/deflate) por omissão.
+        self._session: requests.Session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._session.headers.update({"User-Agent": "FinanceBot/1.0"})
         
         # Dados históricos médios do S&P 500 como fallback
-        self.sp500_historical_return = 0.10  # Retorno médio anual de 10%
+        self.sp500_historical_return: float = 0.10  # Retorno médio anual de 10%
         
-    def get_euribor_rates(self) -> Dict[str, float]:
-        """Obtém as taxas Euribor atuais"""
+    async def close(self) -> None:
+        """Fecha as ligações HTTP abertas pelo bot"""
+        # Termina o resumo pendente para que fique incluído no histórico guardado
+        if self._summary_task is not None:
+            await self._summary_task
+            self._summary_task = None
+        self._save_history()
+        await self._client.close()
+        self._session.close()
+
+    def _load_history(self) -> None:
+        """Retoma a conversa guardada na última sessão deste utilizador"""
         try:
-            # Fonte: Euribor Rates API
-            url = "https://www.euribor-rates.eu/en/current-euribor-rates/"
-            response = requests.get(url)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            rates = {}
-            terms = ['1 week', '1 month', '3 months', '6 months', '12 months']
-            
-            for term in terms:
+            state = orjson.loads(zlib.decompress(self._history_path.read_bytes()))
+            history, summary = state["history"], state["summary"]
+            if not isinstance(history, list) or not isinstance(summary, (str, type(None))):
+                raise ValueError("Histórico guardado com formato inválido")
+        except Exception:
+            # Sem histórico guardado (ou ficheiro inválido) a conversa começa do zero
+            return
+        self.conversation_history = history
+        self.conversation_summary = summary
+
+    def _save_history(self) -> None:
+        """Guarda a conversa comprimida em disco para a próxima sessão"""
+        state = {"history": self.conversation_history, "summary": self.conversation_summary}
+        try:
+            _HISTORY_DIR.mkdir(parents=True, exist_ok=True)
+            self._history_path.write_bytes(zlib.compress(orjson.dumps(state)))
+        except OSError:
+            pass
+
+    @cached(3600, env="CACHE_TTL_EURIBOR")
+    def _fetch_euribor_rates(self) -> Dict[str, float]:
+        """Descarrega as taxas Euribor atuais (lança exceção se falhar)"""
+        # Fonte: Euribor Rates API
+        response = self._session.get(self._EURIBOR_URL, timeout=self.HTTP_TIMEOUT)
+        response.raise_for_status()
+        tree = lxml.html.fromstring(response.content)
+        
+        rates = {}
+        
+        # Uma única passagem pelas linhas da tabela em vez de uma pesquisa por prazo
+        for row in self._TABLE_ROWS(tree):
+            label = self._ROW_LABEL(row)
+            for term in self._EURIBOR_TERMS:
                 # Adaptar o seletor conforme a estrutura real do site
-                rate_element = soup.find(text=lambda t: term in str(t)).find_next('td')
-                rate = float(rate_element.text.strip().replace('%', ''))
-                rates[term] = rate
-                
-            return rates
+                if term in label and term not in rates:
+                    rates[term] = float(self._ROW_VALUE(row).replace('%', ''))
+                    break
+        
+        missing = [term for term in self._EURIBOR_TERMS if term not in rates]
+        if missing:
+            raise ValueError(f"Taxas Euribor não encontradas: {', '.join(missing)}")
             
-        except Exception as e:
-            # Valores fallback caso a API falhe
-            return {
-                "1 week": 3.858,
-                "1 month": 3.923,
-                "3 months": 3.927,
-                "6 months": 3.892,
-                "12 months": 3.718
-            }
+        return rates
 
-    def get_sp500_performance(self) -> Dict[str, float]:
-        """Obtém dados de performance do S&P 500"""
+    async def get_euribor_rates(self) -> Dict[str, float]:
+        """Obtém as taxas Euribor atuais"""
         try:
-            # Usando yfinance para obter dados do S&P 500
-            sp500 = yf.Ticker("^GSPC")
+            # O pedido HTTP é bloqueante, por isso corre numa thread
+            return await asyncio.to_thread(self._fetch_euribor_rates)
             
-            # Obtém dados dos últimos 10 anos
+        except Exception as e:
+            # Cópia para que quem chama não altere os valores partilhados
+            return dict(self._EURIBOR_FALLBACK)
+
+    @cached(900, env="CACHE_TTL_SP500")
+    def _fetch_sp500_performance(self, full_history: bool = False) -> Dict[str, float]:
+        """Descarrega e calcula a performance do S&P 500 (lança exceção se falhar)"""
+        if full_history:
+            # Usando yfinance para obter a série diária completa dos últimos 10 anos
+            sp500 = _yf().Ticker("^GSPC")
             end_date = datetime.now()
             start_date = end_date - timedelta(days=3650)  # ~10 anos
-            
             hist = sp500.history(start=start_date, end=end_date)
-            
-            # Calcula retornos
-            initial_price = hist['Close'].iloc[0]
-            final_price = hist['Close'].iloc[-1]
-            total_return = (final_price - initial_price) / initial_price
-            annual_return = (1 + total_return) ** (1/10) - 1  # Retorno anualizado
-            
-            return {
-                "current_price": final_price,
-                "total_return_10y": total_return * 100,  # em percentual
-                "annual_return": annual_return * 100,     # em percentual
-            }
+            # Indexa o ndarray diretamente, sem o custo do .iloc do pandas
+            closes = hist['Close'].to_numpy()
+        else:
+            # Só são precisos os extremos: os fechos mensais dos últimos 10 anos vêm
+            # diretamente da API do Yahoo em JSON, sem construir DataFrames
+            response = self._session.get(
+                self._SP500_CHART_URL,
+                params=self._SP500_CHART_PARAMS,
+                timeout=self.HTTP_TIMEOUT
+            )
+            response.raise_for_status()
+            result = orjson.loads(response.content)["chart"]["result"][0]
+            closes = [close for close in result["indicators"]["quote"][0]["close"] if close is not None]
+        
+        initial_price, final_price = closes[0], closes[-1]
+        
+        # Calcula retornos
+        total_return = (final_price - initial_price) / initial_price
+        annual_return = (1 + total_return) ** (1/10) - 1  # Retorno anualizado
+        
+        return {
+            "current_price": final_price,
+            "total_return_10y": total_return * 100,  # em percentual
+            "annual_return": annual_return * 100,     # em percentual
+        }
+
+    async def get_sp500_performance(self, full_history: bool = False) -> Dict[str, float]:
+        """Obtém dados de performance do S&P 500
+
+        Por omissão só descarrega os fechos mensais; `full_history` força o download
+        da série diária completa através do yfinance.
+        """
+        try:
+            # Os pedidos HTTP são bloqueantes, por isso correm numa thread
+            return await asyncio.to_thread(self._fetch_sp500_performance, full_history)
             
         except Exception as e:
             # Dados históricos como fallback
@@ -86,116 +363,305 @@ class FinanceBot:
                 "annual_return": self.sp500_historical_return * 100
             }
 
-    def get_stock_info(self, symbol: str) -> Dict:
-        """Obtém informações sobre ações usando yfinance"""
+    @cached(300, env="CACHE_TTL_STOCK")
+    def _fetch_stock_info(self, symbol: str, include_dividend_yield: bool = False) -> Dict:
+        """Descarrega informações sobre uma ação (lança exceção se falhar)"""
+        stock = _yf().Ticker(symbol)
+        # fast_info usa um endpoint leve; o .info completo só é pedido para o dividendo
+        fast_info = stock.fast_info
+        return {
+            "current_price": fast_info.last_price,
+            "dividend_yield": stock.info.get("dividendYield") if include_dividend_yield else None,
+            "fifty_day_average": fast_info.fifty_day_average
+        }
+
+    def get_stock_info(self, symbol: str, include_dividend_yield: bool = False) -> Dict:
+        """Obtém informações sobre ações usando yfinance
+
+        O dividend yield exige o download do perfil completo da ação, por isso só é
+        obtido quando `include_dividend_yield` é verdadeiro.
+        """
         try:
-            stock = yf.Ticker(symbol)
-            info = stock.info
-            return {
-                "current_price": info.get("currentPrice"),
-                "dividend_yield": info.get("dividendYield"),
-                "fifty_day_average": info.get("fiftyDayAverage")
-            }
+            return self._fetch_stock_info(symbol, include_dividend_yield)
         except Exception as e:
             return {"error": str(e)}
 
+    def _download_stock_quotes(self, symbols: Sequence[str]) -> Dict[str, Dict]:
+        """Descarrega as cotações de várias ações num único pedido
+
+        Só inclui no resultado os símbolos para os quais o yfinance devolveu fechos.
+        """
+        # Três meses de fechos diários chegam para a média dos últimos 50 dias;
+        # o yfinance descarrega os vários símbolos em paralelo
+        data = _yf().download(list(symbols), period="3mo", group_by="ticker", threads=True, progress=False)
+        
+        quotes = {}
+        for symbol in symbols:
+            try:
+                closes = data[symbol]["Close"].dropna().to_numpy()
+            except KeyError:
+                continue
+            if closes.size:
+                quotes[symbol] = {
+                    "current_price": closes[-1],
+                    "fifty_day_average": closes[-50:].mean()
+                }
+        return quotes
+
+    def get_stock_info_batch(self, symbols: Sequence[str]) -> Dict[str, Dict]:
+        """Obtém informações de várias ações de uma só vez usando yfinance
+
+        Cada símbolo fica em cache separadamente, por isso um símbolo sem cotações
+        só dá erro para si próprio e não impede a cache dos restantes.
+        """
+        stocks = {}
+        pending = []
+        for symbol in sorted(set(symbols)):
+            quote = _cache_get(f"stock_quote:{symbol!r}")
+            if quote is _MISS:
+                pending.append(symbol)
+            else:
+                stocks[symbol] = quote
+        
+        if pending:
+            try:
+                quotes = self._download_stock_quotes(pending)
+                error = None
+            except Exception as e:
+                quotes, error = {}, str(e)
+            for symbol in pending:
+                if symbol in quotes:
+                    _cache_set(f"stock_quote:{symbol!r}", quotes[symbol], self._STOCK_QUOTE_TTL)
+                    stocks[symbol] = quotes[symbol]
+                else:
+                    stocks[symbol] = {"error": error or f"Sem cotações para {symbol}"}
+        return stocks
+
     def calculate_mortgage_savings(self, 
                                  loan_amount: float,
                                  interest_rate: float,
-                                 extra_payment: float) -> Dict:
-        """Calcula a economia potencial em um empréstimo habitação"""
+                                 extra_payment: float,
+                                 years: float = 30) -> Dict:
+        """Calcula a economia potencial de uma amortização num empréstimo habitação
+
+        Usa o método francês (prestação constante) para um empréstimo de `loan_amount`
+        a `years` anos e compara os dois efeitos possíveis de amortizar `extra_payment`:
+        manter a prestação e reduzir o prazo, ou manter o prazo e reduzir a prestação.
+        As fórmulas fechadas do método evitam simular o plano mês a mês.
+        Lança ValueError se o prazo for inferior a um mês ou a amortização for negativa.
+        """
+        months = round(years * 12)
+        if months < 1:
+            raise ValueError("O prazo do empréstimo deve ser de pelo menos um mês")
+        if extra_payment < 0:
+            raise ValueError("O valor a amortizar não pode ser negativo")
         monthly_rate = interest_rate / 12 / 100
-        total_interest_saved = extra_payment * interest_rate / 100
-        years_reduced = extra_payment / (loan_amount * monthly_rate)
+        installment = _french_installment(loan_amount, monthly_rate, months)
+        baseline_interest = installment * months - loan_amount
+        
+        remaining = max(loan_amount - extra_payment, 0.0)
+        
+        # Efeito no prazo: mantém a prestação e o empréstimo termina mais cedo
+        term_months = _months_to_repay(remaining, monthly_rate, installment)
+        term_interest = installment * term_months - remaining
+        
+        # Efeito na prestação: mantém o prazo e a prestação mensal baixa
+        reduced_installment = _french_installment(remaining, monthly_rate, months)
+        installment_interest = reduced_installment * months - remaining
         
         return {
-            "total_interest_saved": total_interest_saved,
-            "years_reduced": years_reduced
+            "total_interest_saved": baseline_interest - term_interest,
+            "years_reduced": (months - term_months) / 12,
+            "monthly_payment": installment,
+            "reduced_monthly_payment": reduced_installment,
+            "interest_saved_reducing_payment": baseline_interest - installment_interest
         }
 
-    def analyze_investment_options(self, amount: float) -> str:
-        """Analisa diferentes opções de investimento com dados atualizados"""
-        options = []
+    async def analyze_investment_options(self, amount: float, horizons: Sequence[int] = (1,)) -> str:
+        """Analisa diferentes opções de investimento com dados atualizados
+
+        Os ganhos são projetados com juros compostos para cada horizonte em `horizons` (anos).
+        """
+        # Obtém as taxas Euribor e a performance do S&P 500 em paralelo
+        euribor_rates, sp500_data = await asyncio.gather(
+            self.get_euribor_rates(),
+            self.get_sp500_performance()
+        )
         
-        # Obtém taxas Euribor atuais
-        euribor_rates = self.get_euribor_rates()
+        # Certificados do tesouro (usando Euribor 12m + 1% como aproximação)
+        treasury_rate = euribor_rates['12 months'] + 1.0
+        # Investimento em ações (usando dados S&P 500)
+        stock_rate = sp500_data['annual_return']
+        # Amortização de crédito habitação
+        mortgage_rate = euribor_rates['6 months'] + 1.5  # Spread típico de 1.5%
         
-        # Obtém performance do S&P 500
-        sp500_data = self.get_sp500_performance()
+        # Todas as projeções (opção x horizonte) calculadas de uma só vez
+        horizons = np.asarray(horizons)
+        rates = np.array([treasury_rate, stock_rate, mortgage_rate]) / 100
+        projections = _project(amount, rates, horizons)
         
-        # Análise de certificados do tesouro (usando Euribor 12m + 1% como aproximação)
-        treasury_rate = euribor_rates['12 months'] + 1.0
-        treasury_return = amount * (treasury_rate / 100)
-        options.append(f"Certificados do Tesouro (taxa atual: {treasury_rate:.2f}%): €{treasury_return:.2f}/ano")
-        
-        # Análise de investimento em ações (usando dados S&P 500)
-        expected_stock_return = amount * (sp500_data['annual_return'] / 100)
-        options.append(
-            f"Investimento em S&P 500 (retorno médio anual: {sp500_data['annual_return']:.2f}%): "
-            f"€{expected_stock_return:.2f}/ano (estimativa baseada em dados históricos)"
+        labels = (
+            f"Certificados do Tesouro (taxa atual: {treasury_rate:.2f}%)",
+            f"Investimento em S&P 500 (retorno médio anual: {stock_rate:.2f}%)",
+            f"Amortização de Crédito Habitação (taxa atual: {mortgage_rate:.2f}%)"
         )
+        notes = ("", " (estimativa baseada em dados históricos)", " em juros poupados")
         
-        # Análise de amortização de crédito habitação
-        mortgage_rate = euribor_rates['6 months'] + 1.5  # Spread típico de 1.5%
-        mortgage_savings = amount * (mortgage_rate / 100)
-        options.append(
-            f"Amortização de Crédito Habitação (taxa atual: {mortgage_rate:.2f}%): "
-            f"€{mortgage_savings:.2f}/ano em juros poupados"
-        )
+        options = []
+        for label, note, values in zip(labels, notes, projections):
+            amounts = ", ".join(
+                f"€{value:.2f}/ano" if years == 1 else f"€{value:.2f} em {years} anos"
+                for years, value in zip(horizons, values)
+            )
+            options.append(f"{label}: {amounts}{note}")
         
         return "\n".join(options)
 
-    def get_response(self, user_input: str) -> str:
-        """Processa a entrada do usuário e retorna uma resposta"""
-        self.conversation_history.append({"role": "user", "content": user_input})
-        
-        # Prompt base para o GPT
-        system_prompt = """
-        É um consultor financeiro especializado. O cliente poderá fazer perguntas mais gerais sobre a sua situação financeira e pedir aconselhamento geral. Também poderá pedir ajuda para questões 
-        mais especóificas como qual seria a poupança em juros no caso de uma amortização de um crédito à habitação ou crédito pessoal. Tanto nos casos mais específicos como mais gerias antes de uma resposta final 
-        deverão ser feitas questões sobre os parâmetros utilizados para os cálculos como se utiliza taxa variável ou fixa, se existe algum spread, se utilzia o modelo frânces, etc.. As respostas devem ser completas e contemplar
-        a poupança no caso de a amortização ter efeito na prestação mensal ou no prazo de pagamento. Também poderâm ser feitas comparações entre investir o dinheiro em ações, obrigações, ou etfs e a amortização.
-        Os dados deverão ir sendo guardados para que o modelo possa ir aprendendo com as respostas dadas e melhorar a qualidade das respostas.
-        No caso de perguntas da vida financeira geral da pessoa as questões ao utilizador sobre parâmetros como valores que tem como reserva devem ser feitas de forma indirecta e não de forma directa. Pode ser aconselhado o valor ideial 
-        para ter em reserva por exemplo ou para ter na conta corrente ou num eventuial fundo de oportunidade. Estes valores devem ser calculados tendo em conta dados do utilziador. 
-        Deve ser utilziado portugês de Portugal.
+    def _trim_history(self) -> None:
+        """Volta às últimas MAX_TURNS mensagens e resume as restantes em segundo plano"""
+        if len(self.conversation_history) <= 2 * self.MAX_TURNS:
+            return
+        # O resumo é feito enquanto o utilizador escreve a próxima mensagem
+        evicted_count = len(self.conversation_history) - self.MAX_TURNS
+        self._summary_task = asyncio.create_task(self._summarize(evicted_count))
+
+    async def _summarize(self, evicted_count: int) -> None:
+        """Junta as `evicted_count` mensagens mais antigas ao resumo e retira-as do histórico
 
+        As mensagens só saem do histórico depois de o resumo chegar; se o pedido falhar
+        ficam onde estão e o resumo volta a ser tentado no próximo turno. O histórico não
+        muda entretanto porque get_response e close esperam por esta tarefa.
         """
-        
+        messages = self.conversation_history[:evicted_count]
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        if self.conversation_summary:
+            transcript = f"Resumo anterior: {self.conversation_summary}\n{transcript}"
         try:
-            client = openai.Client()  # Corrige a criação do cliente
-
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
+            response = await self._client.chat.completions.create(
+                model=self.SUMMARY_MODEL,
                 messages=[
-                    {"role": "system", "content": system_prompt},  # Corrige o papel da mensagem
-                    *self.conversation_history
-                ]
+                    {
+                        "role": "system",
+                        "content": "Resuma de forma concisa, em português de Portugal, os dados e as "
+                                   "conclusões financeiras relevantes desta conversa."
+                    },
+                    {"role": "user", "content": transcript}
+                ],
+                max_tokens=200,
+                prompt_cache_key=self.PROMPT_CACHE_KEY,
+                safety_identifier=self._safety_identifier
+            )
+            summary = response.choices[0].message.content
+        except Exception:
+            # Se o resumo falhar mantém-se o anterior, e também as mensagens
+            return
+        self.conversation_summary = summary
+        del self.conversation_history[:evicted_count]
+        self._save_history()
+
+    async def get_response(self, user_input: str) -> AsyncIterator[str]:
+        """Processa a entrada do usuário e devolve a resposta em fragmentos à medida que chegam"""
+        # Garante que o resumo das mensagens antigas já está disponível
+        if self._summary_task is not None:
+            await self._summary_task
+            self._summary_task = None
+
+        self.conversation_history.append({"role": "user", "content": user_input})
+        
+        summary = ()
+        if self.conversation_summary:
+            summary = ({"role": "system", "content": f"Resumo da conversa até agora: {self.conversation_summary}"},)
+        messages = (_SYSTEM_MESSAGE, *summary, *self.conversation_history)
+
+        fragments = []
+        try:
+            stream = await self._client.chat.completions.create(
+                model=self.MODEL,
+                messages=messages,
+                stream=True,
+                prompt_cache_key=self.PROMPT_CACHE_KEY,
+                safety_identifier=self._safety_identifier
             )
 
-            bot_response = response.choices[0].message.content  # Correção aqui
-            self.conversation_history.append({"role": "assistant", "content": bot_response})
-            return bot_response
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content or ""
+                if delta:
+                    fragments.append(delta)
+                    yield delta
 
         except Exception as e:
-            return f"Desculpe, ocorreu um erro: {str(e)}"
+            if fragments:
+                # A ligação caiu a meio: guarda a parte da resposta que o utilizador já viu
+                self.conversation_history.append({"role": "assistant", "content": "".join(fragments)})
+                self._trim_history()
+                self._save_history()
+                yield "\n"
+            yield f"Desculpe, ocorreu um erro: {str(e)}"
+            return
 
-def main():
+        # Só guarda a resposta no histórico depois de o stream terminar
+        bot_response = "".join(fragments)
+        self.conversation_history.append({"role": "assistant", "content": bot_response})
+        self._trim_history()
+        # Guarda a conversa a cada turno para não a perder se o processo terminar de repente
+        self._save_history()
+
+async def _ainput(prompt: str) -> str:
+    """Lê uma linha do terminal sem bloquear o event loop
+
+    O input() corre numa thread daemon própria (e não no executor por omissão, que o
+    asyncio.run espera ao terminar), para que Ctrl+C saia sem esperar por um Enter.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def deliver(callback, value):
+        if not future.done():
+            callback(value)
+
+    def read():
+        try:
+            line = input(prompt)
+        except BaseException as e:
+            loop.call_soon_threadsafe(deliver, future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(deliver, future.set_result, line)
+
+    threading.Thread(target=read, daemon=True).start()
+    return await future
+
+async def amain():
     try:
         bot = FinanceBot()
-        print("Bem-vindo ao Consultor Financeiro! (Digite 'sair' para terminar)")
-        
+    except ValueError as e:
+        print(f"Erro de configuração: {e}")
+        print("Por favor, configure suas variáveis de ambiente no arquivo .env")
+        return
+
+    print("Bem-vindo ao Consultor Financeiro! (Digite 'sair' para terminar)")
+    try:
         while True:
-            user_input = input("\nVocê: ")
+            try:
+                user_input = await _ainput("\nVocê: ")
+            except (EOFError, KeyboardInterrupt):
+                print()
+                break
             if user_input.lower() == 'sair':
                 break
                 
-            response = bot.get_response(user_input)
-            print(f"\nConsultor: {response}")
-            
-    except ValueError as e:
-        print(f"Erro de configuração: {e}")
-        print("Por favor, configure suas variáveis de ambiente no arquivo .env")
+            print("\nConsultor: ", end="", flush=True)
+            async for token in bot.get_response(user_input):
+                print(token, end="", flush=True)
+            print()
+    finally:
+        await bot.close()
+
+def main():
+    try:
+        asyncio.run(amain())
+    except KeyboardInterrupt:
+        # Ctrl+C a meio de uma resposta ou à espera do utilizador termina sem traceback
+        print()
 
 if __name__ == "__main__":
     main()